@@ -0,0 +1,46 @@
+import argparse
+
+from .entrypoint import _ARG_SPECS
+
+
+def get_options():
+    """ list of all long options accepted by the CLI """
+
+    options = ["--help"]
+    for flags, _ in _ARG_SPECS:
+        options += [flag for flag in flags if flag.startswith("--")]
+    return options
+
+
+def bash_completion():
+    options = " ".join(get_options())
+    return f'complete -o default -W "{options}" openedx2zim'
+
+
+def fish_completion():
+    return "\n".join(
+        f"complete -c openedx2zim -l {option[2:]}" for option in get_options()
+    )
+
+
+SHELLS = {"bash": bash_completion, "fish": fish_completion}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="openedx2zim.complete",
+        description="Print a static shell completion script for openedx2zim",
+    )
+    parser.add_argument(
+        "--print-completion",
+        help="Shell to print the completion script for",
+        choices=SHELLS.keys(),
+        required=True,
+        dest="shell",
+    )
+    args = parser.parse_args()
+    print(SHELLS[args.shell]())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 # vim: ai ts=4 sts=4 et sw=4 nu
 
+import functools
 import pathlib
 import logging
 
@@ -39,23 +40,40 @@ OPTIMIZER_VERSIONS = {
     "gif": "v1",
 }
 
-DOWNLOADABLE_EXTENSIONS = [
-    ".doc",
-    ".docx",
-    ".pdf",
-    ".mp4",
-    ".webm",
-    ".mp3",
-    ".zip",
-    ".txt",
-    ".csv",
-    ".r",
-    ".aif",
-    ".m4a",
-    ".wav",
-    ".wma",
-    ".ogg",
-]
+DOWNLOADABLE_EXTENSIONS = frozenset(
+    [
+        ".doc",
+        ".docx",
+        ".pdf",
+        ".mp4",
+        ".webm",
+        ".mp3",
+        ".zip",
+        ".txt",
+        ".csv",
+        ".r",
+        ".aif",
+        ".m4a",
+        ".wav",
+        ".wma",
+        ".ogg",
+    ]
+)
+
+# number of assets downloaded concurrently from a single HTML content
+ASSETS_DOWNLOAD_WORKERS = 8
+
+# number of files uploaded concurrently to the S3 optimization cache
+CACHE_UPLOAD_WORKERS = 8
+
+# S3 cache prefixes with more keys are not listed, their keys are checked one by one
+CACHE_LISTING_MAX_KEYS = 10000
+
+# number of subtitle languages of a video downloaded concurrently
+SUBTITLE_DOWNLOAD_WORKERS = 4
+
+# number of answer candidates of a problem checked concurrently on the instance
+PROBLEM_CHECK_WORKERS = 4
 
 UNSUPPORTED_XBLOCKS = {"grademebutton": "Grade Me (Unavailable Offline)"}
 
@@ -68,7 +86,16 @@ def setDebug(debug):
     """ toggle constants global DEBUG flag (used by getLogger) """
     Global.debug = bool(debug)
 
+    # only update the level of an already configured logger
+    if getLogger.cache_info().currsize:
+        level = logging.DEBUG if Global.debug else logging.INFO
+        logger = getLogger()
+        logger.setLevel(level)
+        for handler in logger.handlers:
+            handler.setLevel(level)
 
+
+@functools.lru_cache(maxsize=1)
 def getLogger():
     """ configured logger respecting DEBUG flag """
     return lib_getLogger(NAME, level=logging.DEBUG if Global.debug else logging.INFO)
@@ -1,228 +1,341 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-# vim: ai ts=4 sts=4 et sw=4 nu
-
 import argparse
+import functools
+import os
+import sys
+
+
+class VersionAction(argparse.Action):
+    """ --version action retrieving the scraper version only when requested """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, help=None):
+        super().__init__(
+            option_strings=option_strings,
+            dest=dest,
+            default=argparse.SUPPRESS,
+            nargs=0,
+            help=help,
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from .constants import SCRAPER
+
+        print(SCRAPER)
+        parser.exit()
+
+
+_ARG_SPECS = (
+    (
+        ("--course-url",),
+        {
+            "dest": "course_url",
+            "help": "URL of the course you wnat to scrape",
+            "required": True,
+        },
+    ),
+    (
+        ("--email",),
+        {
+            "dest": "email",
+            "help": "Your registered e-mail ID on the platform. Used for authentication",
+            "required": True,
+        },
+    ),
+    (
+        ("--password",),
+        {
+            "dest": "password",
+            "help": "The password to your registered account on the platform. Read from OPENEDX2ZIM_PASSWORD environment variable if not provided here. Otherwise, you'll be asked for it later",
+        },
+    ),
+    (
+        ("--format",),
+        {
+            "help": "Format to download/transcode video to. webm is smaller",
+            "choices": ["mp4", "webm"],
+            "default": "webm",
+            "dest": "video_format",
+        },
+    ),
+    (
+        ("--low-quality",),
+        {
+            "dest": "low_quality",
+            "help": "Re-encode video using stronger compression",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--autoplay",),
+        {
+            "dest": "autoplay",
+            "help": "Enable autoplay on videos. Behavior differs on platforms/browsers.",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--locale",),
+        {
+            "help": "The locale to use in the UI (can be iso language code / locale)",
+            "dest": "locale_name",
+            "default": "en",
+        },
+    ),
+    (
+        ("--name",),
+        {
+            "dest": "name",
+            "help": "ZIM name. Used as identifier and filename (date will be appended)",
+            "required": True,
+        },
+    ),
+    (
+        ("--title",),
+        {
+            "dest": "title",
+            "help": "Custom title for your ZIM. Based on MOOC otherwise.",
+        },
+    ),
+    (
+        ("--description",),
+        {
+            "dest": "description",
+            "help": "Custom description for your ZIM. Based on MOOC otherwise.",
+        },
+    ),
+    (
+        ("--creator",),
+        {"dest": "creator", "help": "Name of content creator", "default": "edX"},
+    ),
+    (
+        ("--publisher",),
+        {
+            "dest": "publisher",
+            "help": "Custom publisher name (ZIM metadata)",
+            "default": "Kiwix",
+        },
+    ),
+    (
+        ("--tags",),
+        {
+            "dest": "tags",
+            "help": "List of comma-separated Tags for the ZIM file. category:other, openedx, and _videos:yes (if present) added automatically",
+        },
+    ),
+    (
+        ("--ignore-missing-xblocks",),
+        {
+            "dest": "ignore_missing_xblocks",
+            "help": "Ignore unsupported content (xblock)",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--instance-login-page",),
+        {
+            "dest": "instance_login_page",
+            "help": "The login path in the instance. Must start with /",
+            "default": "/login_ajax",
+        },
+    ),
+    (
+        ("--instance-course-page",),
+        {
+            "dest": "instance_course_page",
+            "help": "The path to the course page after the course ID. Must start with /",
+            "default": "/course",
+        },
+    ),
+    (
+        ("--instance-course-prefix",),
+        {
+            "dest": "instance_course_prefix",
+            "help": "The prefix in the path before the course ID. Must start and end with /",
+            "default": "/courses/",
+        },
+    ),
+    (
+        ("--favicon-url",),
+        {
+            "dest": "favicon_url",
+            "help": "URL pointing to a favicon image. Recommended size >= (48px x 48px)",
+            "default": "https://github.com/edx/edx-platform/raw/master/lms/static/images/favicon.ico",
+        },
+    ),
+    (
+        ("--add-wiki",),
+        {
+            "dest": "add_wiki",
+            "help": "Add wiki (if available) to the ZIM",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--add-forum",),
+        {
+            "dest": "add_forum",
+            "help": "Add forum (if available) to the ZIM",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--remove-seq-nav",),
+        {
+            "dest": "remove_seq_nav",
+            "help": "Remove the top sequential navigation bar in the ZIM",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--optimization-cache",),
+        {
+            "help": "URL with credentials and bucket name to S3 Optimization Cache",
+            "dest": "s3_url_with_credentials",
+        },
+    ),
+    (
+        ("--use-any-optimized-version",),
+        {
+            "dest": "use_any_optimized_version",
+            "help": "Use files on S3 cache if present, whatever the version",
+            "default": False,
+            "action": "store_true",
+        },
+    ),
+    (
+        ("--output",),
+        {
+            "help": "Output folder for ZIM file",
+            "default": "output",
+            "dest": "output_dir",
+        },
+    ),
+    (
+        ("--tmp-dir",),
+        {
+            "dest": "tmp_dir",
+            "help": "Path to create temp folder in. Used for building ZIM file. Receives all data",
+        },
+    ),
+    (
+        ("--zim-file",),
+        {"help": "ZIM file name (based on --name if not provided)", "dest": "fname"},
+    ),
+    (
+        ("--no-fulltext-index",),
+        {
+            "dest": "no_fulltext_index",
+            "help": "Don't index the scraped content in the ZIM",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--no-zim",),
+        {
+            "dest": "no_zim",
+            "help": "Don't produce a ZIM file, create build folder only.",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--keep",),
+        {
+            "help": "Don't remove build folder on start (for debug/devel)",
+            "default": False,
+            "action": "store_true",
+            "dest": "keep_build_dir",
+        },
+    ),
+    (
+        ("--debug",),
+        {
+            "dest": "debug",
+            "help": "Enable verbose output",
+            "action": "store_true",
+            "default": False,
+        },
+    ),
+    (
+        ("--threads",),
+        {
+            "dest": "threads",
+            "help": "Number of threads to use while offlining xblocks",
+            "type": int,
+            "default": 1,
+        },
+    ),
+    (
+        ("--version",),
+        {"help": "Display scraper version and exit", "action": VersionAction},
+    ),
+)
+
+
+@functools.lru_cache(maxsize=1)
+def build_parser():
+    """ CLI parser, built once and reused across main() calls """
 
-from .constants import NAME, SCRAPER, getLogger, setDebug
-
-
-def main():
     parser = argparse.ArgumentParser(
-        prog=NAME,
+        prog="openedx2zim",
         description="Scraper to create ZIM files MOOCs on openedx instances",
+        allow_abbrev=False,
     )
 
-    parser.add_argument(
-        "--course-url",
-        help="URL of the course you wnat to scrape",
-        required=True,
-    )
-
-    parser.add_argument(
-        "--email",
-        help="Your registered e-mail ID on the platform. Used for authentication",
-        required=True,
-    )
-
-    parser.add_argument(
-        "--password",
-        help="The password to your registered account on the platform. If you don't provide one here, you'll be asked for it later",
-    )
-
-    parser.add_argument(
-        "--format",
-        help="Format to download/transcode video to. webm is smaller",
-        choices=["mp4", "webm"],
-        default="webm",
-        dest="video_format",
-    )
-
-    parser.add_argument(
-        "--low-quality",
-        help="Re-encode video using stronger compression",
-        action="store_true",
-        default=False,
-    )
-
-    parser.add_argument(
-        "--autoplay",
-        help="Enable autoplay on videos. Behavior differs on platforms/browsers.",
-        action="store_true",
-        default=False,
-    )
-
-    parser.add_argument(
-        "--locale",
-        help="The locale to use in the UI (can be iso language code / locale)",
-        dest="locale_name",
-        default="en",
-    )
-
-    parser.add_argument(
-        "--name",
-        help="ZIM name. Used as identifier and filename (date will be appended)",
-        required=True,
-    )
-
-    parser.add_argument(
-        "--title",
-        help="Custom title for your ZIM. Based on MOOC otherwise.",
-    )
-
-    parser.add_argument(
-        "--description",
-        help="Custom description for your ZIM. Based on MOOC otherwise.",
-    )
-
-    parser.add_argument("--creator", help="Name of content creator", default="edX")
-
-    parser.add_argument(
-        "--publisher", help="Custom publisher name (ZIM metadata)", default="Kiwix"
-    )
-
-    parser.add_argument(
-        "--tags",
-        help="List of comma-separated Tags for the ZIM file. category:other, openedx, and _videos:yes (if present) added automatically",
-    )
-
-    parser.add_argument(
-        "--ignore-missing-xblocks",
-        help="Ignore unsupported content (xblock)",
-        action="store_true",
-        default=False,
-    )
-
-    parser.add_argument(
-        "--instance-login-page",
-        help="The login path in the instance. Must start with /",
-        default="/login_ajax",
-    )
+    for flags, kwargs in _ARG_SPECS:
+        parser.add_argument(*flags, **kwargs)
+    return parser
 
-    parser.add_argument(
-        "--instance-course-page",
-        help="The path to the course page after the course ID. Must start with /",
-        default="/course",
-    )
 
-    parser.add_argument(
-        "--instance-course-prefix",
-        help="The prefix in the path before the course ID. Must start and end with /",
-        default="/courses/",
-    )
+def cli_error_boundary(func):
+    """ decorator logging any failure of func and exiting with status 1 """
 
-    parser.add_argument(
-        "--favicon-url",
-        help="URL pointing to a favicon image. Recommended size >= (48px x 48px)",
-        default="https://github.com/edx/edx-platform/raw/master/lms/static/images/favicon.ico",
-    )
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as exc:
+            from .constants import Global, getLogger
 
-    parser.add_argument(
-        "--add-wiki",
-        help="Add wiki (if available) to the ZIM",
-        action="store_true",
-        default=False,
-    )
+            logger = getLogger()
+            logger.error("FAILED. An error occurred: %s", exc)
+            if Global.debug:
+                logger.exception(exc)
+            raise SystemExit(1) from None
 
-    parser.add_argument(
-        "--add-forum",
-        help="Add forum (if available) to the ZIM",
-        action="store_true",
-        default=False,
-    )
+    return wrapper
 
-    parser.add_argument(
-        "--remove-seq-nav",
-        help="Remove the top sequential navigation bar in the ZIM",
-        action="store_true",
-        default=False,
-    )
-
-    parser.add_argument(
-        "--optimization-cache",
-        help="URL with credentials and bucket name to S3 Optimization Cache",
-        dest="s3_url_with_credentials",
-    )
-
-    parser.add_argument(
-        "--use-any-optimized-version",
-        help="Use files on S3 cache if present, whatever the version",
-        default=False,
-        action="store_true",
-    )
-
-    parser.add_argument(
-        "--output",
-        help="Output folder for ZIM file",
-        default="output",
-        dest="output_dir",
-    )
 
-    parser.add_argument(
-        "--tmp-dir",
-        help="Path to create temp folder in. Used for building ZIM file. Receives all data",
-    )
+@cli_error_boundary
+def scrape(args):
+    from .scraper import Openedx2Zim
 
-    parser.add_argument(
-        "--zim-file",
-        help="ZIM file name (based on --name if not provided)",
-        dest="fname",
-    )
+    scraper = Openedx2Zim(**vars(args))
+    scraper.run()
 
-    parser.add_argument(
-        "--no-fulltext-index",
-        help="Don't index the scraped content in the ZIM",
-        action="store_true",
-        default=False,
-    )
 
-    parser.add_argument(
-        "--no-zim",
-        help="Don't produce a ZIM file, create build folder only.",
-        action="store_true",
-        default=False,
-    )
-
-    parser.add_argument(
-        "--keep",
-        help="Don't remove build folder on start (for debug/devel)",
-        default=False,
-        action="store_true",
-        dest="keep_build_dir",
-    )
+def main():
+    # answer a lone --version without building the whole parser
+    if sys.argv[1:] == ["--version"]:
+        from .constants import SCRAPER
 
-    parser.add_argument(
-        "--debug", help="Enable verbose output", action="store_true", default=False
-    )
+        print(SCRAPER)
+        return
 
-    parser.add_argument(
-        "--threads",
-        help="Number of threads to use while offlining xblocks",
-        type=int,
-        default=1,
-    )
+    args = build_parser().parse_args()
+    if not args.password:
+        args.password = os.getenv("OPENEDX2ZIM_PASSWORD")
 
-    parser.add_argument(
-        "--version",
-        help="Display scraper version and exit",
-        action="version",
-        version=SCRAPER,
-    )
+    from .constants import setDebug
 
-    args = parser.parse_args()
     setDebug(args.debug)
-    logger = getLogger()
-
-    from .scraper import Openedx2Zim
-
-    try:
-        scraper = Openedx2Zim(**dict(args._get_kwargs()))
-        scraper.run()
-    except Exception as exc:
-        logger.error(f"FAILED. An error occurred: {exc}")
-        if args.debug:
-            logger.exception(exc)
-        raise SystemExit(1)
+    scrape(args)
 
 
 if __name__ == "__main__":
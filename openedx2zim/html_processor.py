@@ -1,18 +1,74 @@
+import concurrent.futures
+import functools
 import pathlib
 import re
+import threading
 import urllib
 
 import xxhash
 import lxml.html
 from bs4 import BeautifulSoup
 
-from .constants import DOWNLOADABLE_EXTENSIONS, AUDIO_FORMATS
-from .utils import jinja, prepare_url, get_back_jumps, remove_autogenerated_tags
+from .constants import ASSETS_DOWNLOAD_WORKERS, DOWNLOADABLE_EXTENSIONS, AUDIO_FORMATS
+from .utils import (
+    jinja,
+    prepare_url,
+    get_back_jumps,
+    remove_autogenerated_tags,
+    parse_html,
+)
+
+ASSET_TAGS = ("img", "a", "link", "script", "source", "iframe")
+# opening tag of any of ASSET_TAGS, to skip parsing HTML with nothing to process
+ASSET_TAG_RE = re.compile(r"<(?:{})\b".format("|".join(ASSET_TAGS)), re.IGNORECASE)
+CSS_URL_RE = re.compile(r"url\((.+?)\)")
+CSS_UNTOUCHED_URL_RE = re.compile(r"^(://|data:|#)")
+
+
+def get_elements_by_tag(html_body):
+    """ dict of ASSET_TAGS to their elements in html_body, collected in a single walk """
+
+    elements = {tag: [] for tag in ASSET_TAGS}
+    for element in html_body.iter(*ASSET_TAGS):
+        elements[element.tag].append(element)
+    return elements
+
+
+@functools.lru_cache(maxsize=16384)
+def get_asset_filename(src, with_ext=None):
+    """extension and name of the file an asset is saved as
+
+    memoized as the same assets are referenced from many pages"""
+
+    server_path = pathlib.Path(urllib.parse.urlparse(src).path)
+    ext = with_ext if with_ext else server_path.suffix
+    if server_path.suffix:
+        filename = server_path.with_suffix(ext).name
+    else:
+        filename = xxhash.xxh64(src.encode("utf-8")).hexdigest() + ext
+    return ext, filename
 
 
 class HtmlProcessor:
     def __init__(self, scraper):
         self.scraper = scraper
+        # output file -> future resolving to whether it is available, shared by
+        # the xblock and asset download threads so that a file is fetched once
+        self.known_files = {}
+        # URLs which could not be downloaded, not retried for the rest of the scrape
+        self.failed_urls = set()
+        self.known_files_lock = threading.Lock()
+        self.assets_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=ASSETS_DOWNLOAD_WORKERS
+        )
+        # fingerprint of extracted head/body elements -> processed html strings
+        self.processed_extracts = {}
+        self.processed_extracts_lock = threading.Lock()
+
+    def shutdown(self):
+        """ wait for pending asset downloads and release the download threads """
+
+        self.assets_executor.shutdown(wait=True)
 
     def download_and_get_filename(
         self,
@@ -26,28 +82,45 @@ class HtmlProcessor:
         """downloads a file from src and return the name of the downloaded file
 
         with_ext: ensure that downloaded file has the given extension
-        filter_ext: download only if the file to download has an extension in this list"""
-
-        server_path = pathlib.Path(urllib.parse.urlparse(src).path)
-        ext = with_ext if with_ext else server_path.suffix
+        filter_ext: download only if the file to download has an extension (lowercase) in this collection"""
 
-        if server_path.suffix:
-            filename = server_path.with_suffix(ext).name
-        else:
-            filename = xxhash.xxh64(str(src).encode("utf-8")).hexdigest() + ext
+        ext, filename = get_asset_filename(src, with_ext)
+        if filter_ext and ext.lower() not in filter_ext:
+            return None, None
 
         output_file = output_path.joinpath(filename)
-        if filter_ext and ext not in filter_ext:
-            return None, None
+        url = prepare_url(src, netloc, path_on_server)
+
+        with self.known_files_lock:
+            if url in self.failed_urls:
+                return None, None
+            available = self.known_files.get(output_file)
+            if available is None:
+                self.known_files[output_file] = concurrent.futures.Future()
+
+        # same asset already referenced elsewhere in the course, possibly still
+        # being downloaded by another thread
+        if available is not None:
+            return (filename, False) if available.result() else (None, None)
+
         fresh_download = False
-        if not output_file.exists():
-            if self.scraper.download_file(
-                prepare_url(src, netloc, path_on_server),
-                output_file,
-            ):
-                fresh_download = True
+        try:
+            if not output_file.exists():
+                if self.scraper.download_file(url, output_file):
+                    fresh_download = True
+                else:
+                    return None, None
+        finally:
+            available = self.known_files[output_file]
+            if fresh_download or output_file.exists():
+                available.set_result(True)
             else:
-                return None, None
+                # remember the failing URL, but let another URL saved under the
+                # same file name try to provide it
+                with self.known_files_lock:
+                    self.failed_urls.add(url)
+                    del self.known_files[output_file]
+                available.set_result(False)
         return filename, fresh_download
 
     def download_dependencies_from_css(
@@ -78,7 +151,7 @@ class HtmlProcessor:
 
         # split whole content on `url()` pattern to retrieve a list composed of
         # alternatively pre-pattern text and inside url() –– actual target text
-        parts = re.split(r"url\((.+?)\)", content)
+        parts = CSS_URL_RE.split(content)
         for index, _ in enumerate(parts):
             if index % 2 == 0:  # skip even lines (0, 2, ..) as those are CSS code
                 continue
@@ -88,7 +161,7 @@ class HtmlProcessor:
             css_url = remove_quotes(css_url)
 
             # don't rewrite data: and empty URLs
-            if re.match(r"^(://|data:|#)", css_url):
+            if CSS_UNTOUCHED_URL_RE.match(css_url):
                 parts[index] = encapsulate(css_url)
                 continue
 
@@ -144,12 +217,44 @@ class HtmlProcessor:
         with open(css_path, "w") as fp:
             fp.write("".join(parts))
 
+    def prefetch_assets(self, elements, output_path, netloc, path_on_server):
+        """downloads files referenced in <a>, <img>, <script> and <source> tags concurrently
+
+        files are saved where download_and_get_filename expects them, so that the sequential
+        passes fixing the links find them already present. <link> tags are left to their pass
+        as CSS dependencies are only processed for fresh downloads"""
+
+        sources = {}
+        for anchor in elements["a"]:
+            if "href" in anchor.attrib:
+                sources[anchor.attrib["href"]] = DOWNLOADABLE_EXTENSIONS
+        for tag in ("img", "script", "source"):
+            for element in elements[tag]:
+                if "src" in element.attrib:
+                    sources[element.attrib["src"]] = None
+        if len(sources) < 2:
+            return
+        concurrent.futures.wait(
+            [
+                self.assets_executor.submit(
+                    self.download_and_get_filename,
+                    src=src,
+                    output_path=output_path,
+                    netloc=netloc,
+                    path_on_server=path_on_server,
+                    filter_ext=filter_ext,
+                )
+                for src, filter_ext in sources.items()
+            ]
+        )
+
     def download_images_from_html(
-        self, html_body, output_path, path_from_html, netloc, path_on_server
+        self, imgs, output_path, path_from_html, netloc, path_on_server
     ):
         """ download images from <img> tag and fix path """
 
-        imgs = html_body.xpath("//img")
+        path_prefix = f"{path_from_html}/" if path_from_html else ""
+        has_changed = False
         for img in imgs:
             if "src" in img.attrib:
                 filename, _ = self.download_and_get_filename(
@@ -159,16 +264,13 @@ class HtmlProcessor:
                     path_on_server=path_on_server,
                 )
                 if filename:
-                    img.attrib["src"] = (
-                        f"{filename}"
-                        if not path_from_html
-                        else f"{path_from_html}/{filename}"
-                    )
+                    img.attrib["src"] = f"{path_prefix}{filename}"
                     if "style" in img.attrib:
                         img.attrib["style"] += " max-width:100%"
                     else:
                         img.attrib["style"] = " max-width:100%"
-        return bool(imgs)
+                    has_changed = True
+        return has_changed
 
     def get_root_from_asset(self, path_from_html, root_from_html):
         """ get path to root from the downloaded/generated asset """
@@ -193,7 +295,7 @@ class HtmlProcessor:
 
     def download_documents_from_html(
         self,
-        html_body,
+        anchors,
         output_path,
         path_from_html,
         root_from_html,
@@ -202,7 +304,8 @@ class HtmlProcessor:
     ):
         """ download documents from <a> tag and fix path """
 
-        anchors = html_body.xpath("//a")
+        path_prefix = f"{path_from_html}/" if path_from_html else ""
+        has_changed = False
         for anchor in anchors:
             if "href" in anchor.attrib:
                 filename, _ = self.download_and_get_filename(
@@ -230,12 +333,9 @@ class HtmlProcessor:
                                 audio_format=file_format,
                             )
                         filename = html_fpath.name
-                    anchor.attrib["href"] = (
-                        f"{filename}"
-                        if not path_from_html
-                        else f"{path_from_html}/{filename}"
-                    )
-        return bool(anchors)
+                    anchor.attrib["href"] = f"{path_prefix}{filename}"
+                    has_changed = True
+        return has_changed
 
     def get_path_and_netloc_to_send(self, netloc, path_on_server, downloaded_asset_url):
         """get the path and netloc to send recursively after downloading asset from downloaded_asset_url
@@ -259,11 +359,12 @@ class HtmlProcessor:
         return path_recursive, netloc_recursive
 
     def download_css_from_html(
-        self, html_body, output_path, path_from_html, netloc, path_on_server
+        self, css_files, output_path, path_from_html, netloc, path_on_server
     ):
         """ download css files from <link> tag and fix path """
 
-        css_files = html_body.xpath("//link")
+        path_prefix = f"{path_from_html}/" if path_from_html else ""
+        has_changed = False
         for css in css_files:
             if "href" in css.attrib:
                 filename, fresh_download = self.download_and_get_filename(
@@ -287,19 +388,17 @@ class HtmlProcessor:
                             netloc=netloc_recursive,
                             path_on_server=path_recursive,
                         )
-                    css.attrib["href"] = (
-                        f"{filename}"
-                        if not path_from_html
-                        else f"{path_from_html}/{filename}"
-                    )
-        return bool(css_files)
+                    css.attrib["href"] = f"{path_prefix}{filename}"
+                    has_changed = True
+        return has_changed
 
     def download_js_from_html(
-        self, html_body, output_path, path_from_html, netloc, path_on_server
+        self, js_files, output_path, path_from_html, netloc, path_on_server
     ):
         """ download javascript from <script> tag and fix path """
 
-        js_files = html_body.xpath("//script")
+        path_prefix = f"{path_from_html}/" if path_from_html else ""
+        has_changed = False
         for js in js_files:
             if "src" in js.attrib:
                 filename, _ = self.download_and_get_filename(
@@ -309,19 +408,17 @@ class HtmlProcessor:
                     path_on_server=path_on_server,
                 )
                 if filename:
-                    js.attrib["src"] = (
-                        f"{filename}"
-                        if not path_from_html
-                        else f"{path_from_html}/{filename}"
-                    )
-        return bool(js_files)
+                    js.attrib["src"] = f"{path_prefix}{filename}"
+                    has_changed = True
+        return has_changed
 
     def download_sources_from_html(
-        self, html_body, output_path, path_from_html, netloc, path_on_server
+        self, sources, output_path, path_from_html, netloc, path_on_server
     ):
         """ downloads content from <source> tags """
 
-        sources = html_body.xpath("//source")
+        path_prefix = f"{path_from_html}/" if path_from_html else ""
+        has_changed = False
         for source in sources:
             if "src" in source.attrib:
                 filename, _ = self.download_and_get_filename(
@@ -331,16 +428,13 @@ class HtmlProcessor:
                     path_on_server=path_on_server,
                 )
                 if filename:
-                    source.attrib["src"] = (
-                        f"{filename}"
-                        if not path_from_html
-                        else f"{path_from_html}/{filename}"
-                    )
-        return bool(sources)
+                    source.attrib["src"] = f"{path_prefix}{filename}"
+                    has_changed = True
+        return has_changed
 
     def download_iframes_from_html(
         self,
-        html_body,
+        iframes,
         output_path,
         path_from_html,
         root_from_html,
@@ -349,7 +443,8 @@ class HtmlProcessor:
     ):
         """ download youtube videos and pdf files from iframes in html content """
 
-        iframes = html_body.xpath("//iframe")
+        path_prefix = f"{path_from_html}/" if path_from_html else ""
+        has_changed = False
         for iframe in iframes:
             if "src" in iframe.attrib:
                 src = iframe.attrib["src"]
@@ -367,15 +462,14 @@ class HtmlProcessor:
                             "video.html",
                             False,
                             format=self.scraper.video_format,
-                            video_path=f"{filename}"
-                            if not path_from_html
-                            else f"{path_from_html}/{filename}",
+                            video_path=f"{path_prefix}{filename}",
                             subs=[],
                             autoplay=self.scraper.autoplay,
                             path_to_root=root_from_html,
                             title="",
                         )
-                        iframe.getparent().replace(iframe, lxml.html.fromstring(x))
+                        iframe.getparent().replace(iframe, parse_html(x))
+                        has_changed = True
                 elif ".pdf" in src:
                     filename, _ = self.download_and_get_filename(
                         src=src,
@@ -384,11 +478,8 @@ class HtmlProcessor:
                         path_on_server=path_on_server,
                     )
                     if filename:
-                        iframe.attrib["src"] = (
-                            f"{filename}"
-                            if not path_from_html
-                            else f"{path_from_html}/{filename}"
-                        )
+                        iframe.attrib["src"] = f"{path_prefix}{filename}"
+                        has_changed = True
                 else:
                     # handle iframe recursively
                     iframe_url = prepare_url(src, netloc)
@@ -414,12 +505,9 @@ class HtmlProcessor:
                     fpath = output_path.joinpath(filename)
                     with open(fpath, "w") as html_file:
                         html_file.write(modified_content)
-                    iframe.attrib["src"] = (
-                        f"{filename}"
-                        if not path_from_html
-                        else f"{path_from_html}/{filename}"
-                    )
-        return bool(iframes)
+                    iframe.attrib["src"] = f"{path_prefix}{filename}"
+                    has_changed = True
+        return has_changed
 
     def handle_jump_to_paths(self, target_path):
         """ return a fixed path in zim for a inter-xblock path containing jump_to """
@@ -440,7 +528,7 @@ class HtmlProcessor:
                 # Only vertical and course xblocks have HTMLs
                 return check_descendants_and_return_path(xblock_extractor)
 
-    def rewrite_internal_links(self, html_body, root_from_html, netloc):
+    def rewrite_internal_links(self, anchors, root_from_html, netloc):
         """ rewrites internal links and ensures no root-relative links are left behind """
 
         def update_root_relative_path(anchor, fixed_path, root_from_html, netloc):
@@ -452,7 +540,6 @@ class HtmlProcessor:
             else:
                 anchor.attrib["href"] = netloc + anchor.attrib["href"]
 
-        anchors = html_body.xpath("//a")
         path_prefix = f"{self.scraper.instance_config['course_prefix']}{urllib.parse.unquote_plus(self.scraper.course_id)}"
         has_changed = False
         for anchor in anchors:
@@ -504,17 +591,28 @@ class HtmlProcessor:
         netloc=None,
         path_on_server="",
     ):
-        """ downloads all static dependencies from an HTML content, and fixes links """
+        """downloads all static dependencies from an HTML content, and fixes links
+
+        content: an HTML string, or an already parsed lxml element which is updated in place
+        returns the processed HTML string"""
 
         if not netloc:
             netloc = self.scraper.instance_url
 
-        html_body = lxml.html.fromstring(str(content))
+        is_parsed = isinstance(content, lxml.html.HtmlElement)
+        if not is_parsed:
+            # serialize soup elements only once
+            content = str(content)
+            if not ASSET_TAG_RE.search(content):
+                return content
+        html_body = content if is_parsed else parse_html(content)
+        elements = get_elements_by_tag(html_body)
+        self.prefetch_assets(elements, output_path, netloc, path_on_server)
         imgs = self.download_images_from_html(
-            html_body, output_path, path_from_html, netloc, path_on_server
+            elements["img"], output_path, path_from_html, netloc, path_on_server
         )
         docs = self.download_documents_from_html(
-            html_body,
+            elements["a"],
             output_path,
             path_from_html,
             root_from_html,
@@ -522,34 +620,41 @@ class HtmlProcessor:
             path_on_server,
         )
         css_files = self.download_css_from_html(
-            html_body, output_path, path_from_html, netloc, path_on_server
+            elements["link"], output_path, path_from_html, netloc, path_on_server
         )
         js_files = self.download_js_from_html(
-            html_body, output_path, path_from_html, netloc, path_on_server
+            elements["script"], output_path, path_from_html, netloc, path_on_server
         )
         sources = self.download_sources_from_html(
-            html_body,
+            elements["source"],
             output_path,
             path_from_html,
             netloc,
             path_on_server,
         )
         iframes = self.download_iframes_from_html(
-            html_body,
+            elements["iframe"],
             output_path,
             path_from_html,
             root_from_html,
             netloc,
             path_on_server,
         )
-        rewritten_links = self.rewrite_internal_links(html_body, root_from_html, netloc)
-        if any([imgs, docs, css_files, js_files, sources, iframes, rewritten_links]):
-            content = lxml.html.tostring(html_body, encoding="unicode")
+        rewritten_links = self.rewrite_internal_links(
+            elements["a"], root_from_html, netloc
+        )
+        if is_parsed or any(
+            [imgs, docs, css_files, js_files, sources, iframes, rewritten_links]
+        ):
+            content = lxml.html.tostring(
+                html_body, encoding="unicode", with_tail=not is_parsed
+            )
         return content
 
     def defer_scripts(self, content, output_path, path_from_html):
         """ defer all scripts in content. For inline scripts, they're placed in a *.js file and deferred """
 
+        path_prefix = f"{path_from_html}/" if path_from_html else ""
         soup = BeautifulSoup(content, "lxml")
         script_tags = soup.find_all("script")
         for script_tag in script_tags:
@@ -574,14 +679,45 @@ class HtmlProcessor:
                 with open(fpath, "w") as fp:
                     fp.write(script_content)
                 script_tag.string = ""
-                script_tag.attrs["src"] = (
-                    f"{filename}"
-                    if not path_from_html
-                    else f"{path_from_html}/{filename}"
-                )
+                script_tag.attrs["src"] = f"{path_prefix}{filename}"
                 script_tag.attrs["defer"] = None
         return str(soup)
 
+    def process_extracted_elements(
+        self, elements, output_path, path_from_html, root_from_html
+    ):
+        """returns a list of processed html strings representing elements
+
+        the LMS page around xblocks is mostly identical across a course, so the
+        result is reused for the same elements processed with the same paths"""
+
+        contents = [str(element) for element in elements]
+        fingerprint = (
+            xxhash.xxh64("\n".join(contents).encode("utf-8")).hexdigest(),
+            len(contents),
+            output_path,
+            path_from_html,
+            root_from_html,
+        )
+        with self.processed_extracts_lock:
+            processed = self.processed_extracts.get(fingerprint)
+        if processed is None:
+            processed = [
+                remove_autogenerated_tags(
+                    self.dl_dependencies_and_fix_links(
+                        content=content,
+                        output_path=output_path,
+                        path_from_html=path_from_html,
+                        root_from_html=root_from_html,
+                    )
+                )
+                for content in contents
+            ]
+            with self.processed_extracts_lock:
+                self.processed_extracts[fingerprint] = processed
+        # callers extend the returned list
+        return list(processed)
+
     def extract_head_css_js(self, soup, output_path, path_from_html, root_from_html):
         """returns a list of processed html strings representing CSS and JS within the <head> element
 
@@ -598,19 +734,9 @@ class HtmlProcessor:
             + html_headers.find_all("style", recursive=False)
         )
 
-        extra_head_content = []
-        for header_element in head_css_js:
-            extra_head_content.append(
-                remove_autogenerated_tags(
-                    self.dl_dependencies_and_fix_links(
-                        content=str(header_element),
-                        output_path=output_path,
-                        path_from_html=path_from_html,
-                        root_from_html=root_from_html,
-                    )
-                )
-            )
-        return extra_head_content
+        return self.process_extracted_elements(
+            head_css_js, output_path, path_from_html, root_from_html
+        )
 
     def extract_body_end_scripts(
         self, soup, output_path, path_from_html, root_from_html
@@ -623,16 +749,6 @@ class HtmlProcessor:
 
         html_body = soup.find("body")
         body_scripts = html_body.find_all("script", recursive=False)
-        body_end_scripts = []
-        for script in body_scripts:
-            body_end_scripts.append(
-                remove_autogenerated_tags(
-                    self.dl_dependencies_and_fix_links(
-                        content=str(script),
-                        output_path=output_path,
-                        path_from_html=path_from_html,
-                        root_from_html=root_from_html,
-                    )
-                )
-            )
-        return body_end_scripts
+        return self.process_extracted_elements(
+            body_scripts, output_path, path_from_html, root_from_html
+        )
@@ -5,16 +5,21 @@ import json
 import sys
 import urllib
 
+import requests
+from requests.adapters import HTTPAdapter
+
 from .constants import getLogger, LANGUAGE_COOKIES, OPENEDX_LANG_MAP
 
 logger = getLogger()
 
 
-def get_response(url, post_data, headers, max_attempts=5):
-    req = urllib.request.Request(url, post_data, headers)
+def get_response(session, url, post_data, headers, max_attempts=5):
+    method = "POST" if post_data is not None else "GET"
     for attempt in range(max_attempts):
         try:
-            return urllib.request.urlopen(req).read().decode("utf-8")
+            response = session.request(method, url, data=post_data, headers=headers)
+            response.raise_for_status()
+            return response.content.decode("utf-8")
         except Exception as exc:
             if attempt < max_attempts - 1:
                 logger.debug(f"Error opening {url}: {exc}\nRetrying ...")
@@ -30,6 +35,7 @@ class InstanceConnection:
         self.password = password if password else getpass.getpass(stream=sys.stderr)
         self.instance_config = instance_config
         self.cookie_jar = http.cookiejar.LWPCookieJar("lol.cookies")
+        self.session = None
         self.headers = None
         self.instance_connection = None
         self.user = None
@@ -43,12 +49,15 @@ class InstanceConnection:
         self.headers.update({"X-CSRFToken": csrf_token})
 
     def generate_connection_headers(self):
-        opener = urllib.request.build_opener(
-            urllib.request.HTTPCookieProcessor(self.cookie_jar)
-        )
-        opener.addheaders = [("User-Agent", "Mozilla/5.0")]
-        urllib.request.install_opener(opener)
-        opener.open(self.instance_config["instance_url"] + "/login")
+        # single session shared by all threads, keeping connections to the instance alive
+        self.session = requests.Session()
+        for prefix in ("http://", "https://"):
+            self.session.mount(
+                prefix, HTTPAdapter(pool_connections=32, pool_maxsize=32)
+            )
+        self.session.cookies = self.cookie_jar
+        self.session.headers["User-Agent"] = "Mozilla/5.0"
+        self.session.get(self.instance_config["instance_url"] + "/login")
         self.headers = {
             "User-Agent": "Mozilla/5.0",
             "Accept": "application/json, text/javascript, */*; q=0.01",
@@ -87,7 +96,10 @@ class InstanceConnection:
             headers["Referer"] = referer
         return json.loads(
             get_response(
-                self.instance_config["instance_url"] + page, post_data, headers
+                self.session,
+                self.instance_config["instance_url"] + page,
+                post_data,
+                headers,
             )
         )
 
@@ -95,9 +107,10 @@ class InstanceConnection:
         self.update_csrf_token_in_headers()
         headers = copy.deepcopy(self.headers)
         headers["X-Requested-With"] = ""
-        return get_response(url, None, headers)
+        return get_response(self.session, url, None, headers)
 
     def get_redirection(self, url):
         self.update_csrf_token_in_headers()
-        req = urllib.request.Request(url, None, self.headers)
-        return urllib.request.urlopen(req).geturl()
+        with self.session.get(url, headers=self.headers, stream=True) as response:
+            response.raise_for_status()
+            return response.url
@@ -11,14 +11,16 @@ import re
 import shutil
 import sys
 import tempfile
+import threading
 import urllib
 import uuid
 
+import lxml.etree
+from boto3.s3.transfer import TransferConfig
 from bs4 import BeautifulSoup
 from kiwixstorage import KiwixStorage
 from pif import get_public_ip
-from slugify import slugify
-from zimscraperlib.download import BestMp4, BestWebm, YoutubeDownloader, save_large_file
+from zimscraperlib.download import BestMp4, BestWebm, YoutubeDownloader
 from zimscraperlib.i18n import get_language_details, setlocale, _
 from zimscraperlib.image.convertion import convert_image
 from zimscraperlib.image.transformation import resize_image
@@ -33,6 +35,8 @@ from zimscraperlib.zim import make_zim_file
 
 from .annex import MoocForum, MoocWiki
 from .constants import (
+    CACHE_LISTING_MAX_KEYS,
+    CACHE_UPLOAD_WORKERS,
     IMAGE_FORMATS,
     OPTIMIZER_VERSIONS,
     ROOT_DIR,
@@ -43,13 +47,18 @@ from .constants import (
 from .html_processor import HtmlProcessor
 from .instance_connection import InstanceConnection
 from .utils import (
+    cached_slugify,
     check_missing_binary,
     exec_cmd,
     get_back_jumps,
     get_meta_from_url,
     jinja,
     jinja_init,
+    link_or_copy,
+    parse_html,
     prepare_url,
+    remove_tree,
+    save_file,
 )
 from .xblocks_extractor.chapter import Chapter
 from .xblocks_extractor.course import Course
@@ -82,6 +91,42 @@ XBLOCK_EXTRACTORS = {
     "unavailable": Unavailable,
 }
 
+# large videos are transferred in parts, a few at a time, to and from the S3 cache
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+# XPath matching elements having a given CSS class (like BeautifulSoup's class_ filter)
+CLASS_XPATH = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')"
+
+# candidates for the course tabs container, by order of preference
+COURSE_TABS_XPATHS = [
+    f"//{tag}[{CLASS_XPATH.format(css_class)}]"
+    for tag, css_class in (
+        ("ol", "course-material"),
+        ("ul", "course-material"),
+        ("ul", "navbar-nav"),
+        ("ol", "course-tabs"),
+    )
+]
+
+WELCOME_MESSAGE_XPATH = f"//div[{CLASS_XPATH.format('welcome-message')}]"
+INFO_ARTICLES_XPATH = "//div[contains(@class, 'info-wrapper')]"
+
+# elements removed from the homepage articles, first of each tag only
+UNWANTED_HOMEPAGE_XPATH = lxml.etree.XPath(
+    " | ".join(
+        f".//{tag}[{CLASS_XPATH.format(css_class)}]"
+        for tag, css_class in (
+            ("div", "dismiss-message"),
+            ("a", "action-show-bookmarks"),
+            ("button", "toggle-visibility-button"),
+        )
+    )
+)
+
 logger = getLogger()
 
 
@@ -152,6 +197,13 @@ class Openedx2Zim:
         self.threads = threads
         self.yt_downloader = YoutubeDownloader(threads=1)
 
+        # ffmpeg is multi-threaded already, so only a few encodes should run at once
+        self.video_encoding_slots = threading.BoundedSemaphore(
+            max(1, (os.cpu_count() or 1) // 2)
+        )
+        # image optimizers are single-threaded, run at most one per CPU
+        self.image_optimization_slots = threading.BoundedSemaphore(os.cpu_count() or 1)
+
         # authentication
         self.email = email
         self.password = password
@@ -167,6 +219,12 @@ class Openedx2Zim:
         self.s3_url_with_credentials = s3_url_with_credentials
         self.use_any_optimized_version = use_any_optimized_version
         self.s3_storage = None
+        # key prefix -> future resolving to the set of cached keys, None if not listed
+        self.s3_cached_keys = {}
+        self.s3_cached_keys_lock = threading.Lock()
+        self.cache_uploads_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=CACHE_UPLOAD_WORKERS
+        )
 
         # debug/developer options
         self.no_zim = no_zim
@@ -189,6 +247,7 @@ class Openedx2Zim:
         self.annexed_pages = []
         self.book_lists = []
         self.course_tabs = {}
+        self.course_page = None
         self.course_xblocks = None
         self.root_xblock_id = None
         self.wiki = None
@@ -212,12 +271,12 @@ class Openedx2Zim:
         return self.build_dir.joinpath("instance_assets")
 
     def get_course_id(self, url, course_page_name, course_prefix, instance_url):
-        clean_url = re.match(
-            instance_url + course_prefix + ".*" + course_page_name, url
+        course_id_re = re.compile(
+            re.escape(instance_url + course_prefix)
+            + r"(.*)"
+            + re.escape(course_page_name)
         )
-        clean_id = clean_url.group(0)[
-            len(instance_url + course_prefix) : -len(course_page_name)
-        ]
+        clean_id = course_id_re.match(url).group(1)
         if "%3" in clean_id:  # course_id seems already encode
             return clean_id
         return urllib.parse.quote_plus(clean_id)
@@ -231,56 +290,60 @@ class Openedx2Zim:
             self.instance_url,
         )
         logger.info("Getting course info ...")
+        user_query = urllib.parse.urlencode({"username": self.instance_connection.user})
         self.course_info = self.instance_connection.get_api_json(
-            "/api/courses/v1/courses/"
-            + self.course_id
-            + "?username="
-            + self.instance_connection.user
+            f"/api/courses/v1/courses/{self.course_id}?{user_query}"
         )
-        self.course_name_slug = slugify(self.course_info["name"])
+        self.course_name_slug = cached_slugify(self.course_info["name"])
         logger.info("Getting course xblocks ...")
+        # course_id is already quoted, unquote it to avoid double encoding
+        blocks_query = urllib.parse.urlencode(
+            {
+                "course_id": urllib.parse.unquote_plus(self.course_id),
+                "username": self.instance_connection.user,
+                "depth": "all",
+                "requested_fields": "graded,format,student_view_multi_device",
+                "student_view_data": "video,discussion",
+                "block_counts": "video,discussion,problem",
+                "nav_depth": "3",
+            }
+        )
         xblocks_data = self.instance_connection.get_api_json(
-            "/api/courses/v1/blocks/?course_id="
-            + self.course_id
-            + "&username="
-            + self.instance_connection.user
-            + "&depth=all&requested_fields=graded,format,student_view_multi_device&student_view_data=video,discussion&block_counts=video,discussion,problem&nav_depth=3"
+            f"/api/courses/v1/blocks/?{blocks_query}"
         )
         self.course_xblocks = xblocks_data["blocks"]
         self.root_xblock_id = xblocks_data["root"]
 
     def parse_course_xblocks(self):
-        def make_objects(current_path, current_id, root_url):
+        def open_xblock(current_path, current_id, root_url, parent_descendants):
+            """ returns the traversal frame of an xblock, before its descendants are made """
+
             current_xblock = self.course_xblocks[current_id]
             # ensure the display name is not empty to avoid path issues
             if not current_xblock["display_name"]:
                 current_xblock["display_name"] = "xblock"
-            xblock_path = current_path.joinpath(slugify(current_xblock["display_name"]))
+            xblock_path = current_path.joinpath(
+                cached_slugify(current_xblock["display_name"])
+            )
 
             # update root url respective to the current xblock
             root_url = root_url + "../"
-            random_id = str(uuid.uuid4())
-            descendants = None
-
-            # recursively make objects for all descendents
-            if "descendants" in current_xblock:
-                descendants = []
-                for next_xblock_id in current_xblock["descendants"]:
-                    descendants.append(
-                        make_objects(xblock_path, next_xblock_id, root_url)
-                    )
+            descendants = [] if "descendants" in current_xblock else None
+            return (
+                current_xblock,
+                xblock_path,
+                root_url,
+                descendants,
+                iter(current_xblock.get("descendants", [])),
+                parent_descendants,
+            )
+
+        def make_object(current_xblock, xblock_path, root_url, descendants):
+            random_id = uuid.uuid4().hex
 
             # create objects of respective xblock_extractor if available
-            if current_xblock["type"] in XBLOCK_EXTRACTORS:
-                obj = XBLOCK_EXTRACTORS[current_xblock["type"]](
-                    xblock_json=current_xblock,
-                    relative_path=xblock_path,
-                    root_url=root_url,
-                    xblock_id=random_id,
-                    descendants=descendants,
-                    scraper=self,
-                )
-            else:
+            xblock_extractor = XBLOCK_EXTRACTORS.get(current_xblock["type"])
+            if xblock_extractor is None:
                 if not self.ignore_missing_xblocks:
                     logger.error(
                         f"Unsupported xblock: {current_xblock['type']} URL: {current_xblock['student_view_url']}"
@@ -288,19 +351,19 @@ class Openedx2Zim:
                         f"  You can ignore this message by passing --ignore-missing-xblocks in atguments"
                     )
                     sys.exit(1)
-                else:
-                    logger.warning(
-                        f"Ignoring unsupported xblock: {current_xblock['type']} URL: {current_xblock['student_view_url']}"
-                    )
-                    # make an object of unavailable type
-                    obj = XBLOCK_EXTRACTORS["unavailable"](
-                        xblock_json=current_xblock,
-                        relative_path=xblock_path,
-                        root_url=root_url,
-                        xblock_id=random_id,
-                        descendants=descendants,
-                        scraper=self,
-                    )
+                logger.warning(
+                    f"Ignoring unsupported xblock: {current_xblock['type']} URL: {current_xblock['student_view_url']}"
+                )
+                # make an object of unavailable type
+                xblock_extractor = XBLOCK_EXTRACTORS["unavailable"]
+            obj = xblock_extractor(
+                xblock_json=current_xblock,
+                relative_path=xblock_path,
+                root_url=root_url,
+                xblock_id=random_id,
+                descendants=descendants,
+                scraper=self,
+            )
 
             if current_xblock["type"] == "course":
                 self.head_course_xblock = obj
@@ -308,11 +371,21 @@ class Openedx2Zim:
             return obj
 
         logger.info("Parsing xblocks and preparing extractor objects ...")
-        make_objects(
-            current_path=pathlib.Path("course"),
-            current_id=self.root_xblock_id,
-            root_url="../",
-        )
+        # walk the tree with an explicit stack, making objects in post-order
+        # so that all descendants of an xblock exist before the xblock itself
+        stack = [open_xblock(pathlib.Path("course"), self.root_xblock_id, "../", None)]
+        while stack:
+            xblock, xblock_path, root_url, descendants, pending, parent = stack[-1]
+            next_xblock_id = next(pending, None)
+            if next_xblock_id is not None:
+                stack.append(
+                    open_xblock(xblock_path, next_xblock_id, root_url, descendants)
+                )
+                continue
+            stack.pop()
+            obj = make_object(xblock, xblock_path, root_url, descendants)
+            if parent is not None:
+                parent.append(obj)
 
     def get_book_list(self, book, output_path):
         pdf = book.find_all("a")
@@ -387,7 +460,7 @@ class Openedx2Zim:
             tab_path = "/index.html"
         elif "wiki" in tab_org_path and self.add_wiki:
             self.wiki = MoocWiki(self)
-            tab_path = f"{str(self.wiki.wiki_path)}/index.html"
+            tab_path = f"{self.wiki.wiki_path}/index.html"
         elif "forum" in tab_org_path and self.add_forum:
             self.forum = MoocForum(self)
             tab_path = "forum/index.html"
@@ -401,60 +474,87 @@ class Openedx2Zim:
                 tab_path = self.annex_extra_page(tab_href, tab_org_path)
         return tab_name, tab_path
 
+    def get_course_page(self):
+        """parsed course homepage, or None if it can't be fetched
+
+        fetched once as both the course tabs and the homepage content are extracted from it"""
+
+        if self.course_page is None:
+            content = self.instance_connection.get_page(self.course_url)
+            if content:
+                self.course_page = parse_html(content)
+        return self.course_page
+
     def get_course_tabs(self):
         logger.info("Getting course tabs ...")
-        content = self.instance_connection.get_page(self.course_url)
-        if not content:
+        html_body = self.get_course_page()
+        if html_body is None:
             logger.error("Failed to get course tabs")
             raise SystemExit(1)
-        soup = BeautifulSoup(content, "lxml")
-        course_tabs = (
-            soup.find("ol", attrs={"class": "course-material"})
-            or soup.find("ul", attrs={"class": "course-material"})
-            or soup.find("ul", attrs={"class": "navbar-nav"})
-            or soup.find("ol", attrs={"class": "course-tabs"})
-        )
+        course_tabs = None
+        for xpath in COURSE_TABS_XPATHS:
+            course_tabs = next(iter(html_body.xpath(xpath)), None)
+            if course_tabs is not None:
+                break
         if course_tabs is not None:
-            for tab in course_tabs.find_all("li"):
+            for tab in course_tabs.iter("li"):
                 tab_name, tab_path = self.get_tab_path_and_name(
-                    tab_text=tab.get_text(), tab_href=tab.find("a")["href"]
+                    tab_text=tab.text_content(), tab_href=tab.find(".//a").get("href")
                 )
                 if tab_name is not None and tab_path is not None:
                     self.course_tabs[tab_name] = tab_path
 
+    def process_annexed_page(self, page):
+        """ download dependencies of an annexed page and fix its links """
+
+        root_from_html = get_back_jumps(
+            len(page["output_path"].relative_to(self.build_dir).parts)
+        )
+        soup = page["content"]
+        path_from_html = root_from_html + "instance_assets"
+        extra_head_content = self.html_processor.extract_head_css_js(
+            soup=soup,
+            output_path=self.instance_assets_dir,
+            path_from_html=path_from_html,
+            root_from_html=root_from_html,
+        )
+        body_end_scripts = self.html_processor.extract_body_end_scripts(
+            soup=soup,
+            output_path=self.instance_assets_dir,
+            path_from_html=path_from_html,
+            root_from_html=root_from_html,
+        )
+        page["content"] = self.html_processor.dl_dependencies_and_fix_links(
+            content=str(soup.find("div", attrs={"class": "xblock"})),
+            output_path=self.instance_assets_dir,
+            path_from_html=path_from_html,
+            root_from_html=root_from_html,
+        )
+        page.update(
+            {
+                "extra_head_content": extra_head_content,
+                "body_end_scripts": body_end_scripts,
+            }
+        )
+
     def annex(self):
         self.get_course_tabs()
         logger.info("Downloading content for extra pages ...")
-        for page in self.annexed_pages:
-            root_from_html = get_back_jumps(
-                len(page["output_path"].relative_to(self.build_dir).parts)
-            )
-            soup = page["content"]
-            path_from_html = root_from_html + "instance_assets"
-            extra_head_content = self.html_processor.extract_head_css_js(
-                soup=soup,
-                output_path=self.instance_assets_dir,
-                path_from_html=path_from_html,
-                root_from_html=root_from_html,
-            )
-            body_end_scripts = self.html_processor.extract_body_end_scripts(
-                soup=soup,
-                output_path=self.instance_assets_dir,
-                path_from_html=path_from_html,
-                root_from_html=root_from_html,
-            )
-            page["content"] = self.html_processor.dl_dependencies_and_fix_links(
-                content=str(soup.find("div", attrs={"class": "xblock"})),
-                output_path=self.instance_assets_dir,
-                path_from_html=path_from_html,
-                root_from_html=root_from_html,
-            )
-            page.update(
-                {
-                    "extra_head_content": extra_head_content,
-                    "body_end_scripts": body_end_scripts,
-                }
-            )
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.threads
+        ) as executor:
+            # processing a page can annex the pages it links to, so keep
+            # submitting until no new page has been appended
+            nb_submitted = 0
+            while nb_submitted < len(self.annexed_pages):
+                fs = [
+                    executor.submit(self.process_annexed_page, page)
+                    for page in self.annexed_pages[nb_submitted:]
+                ]
+                nb_submitted += len(fs)
+                for future in fs:
+                    # re-raise errors from the workers (SystemExit included)
+                    future.result()
 
         logger.info("Processing book lists ...")
         for item in self.book_lists:
@@ -478,7 +578,7 @@ class Openedx2Zim:
         favicon_fpath = self.build_dir.joinpath("favicon.png")
 
         # download the favicon
-        save_large_file(self.favicon_url, favicon_fpath)
+        save_file(self.favicon_url, favicon_fpath)
 
         # convert and resize
         convert_image(favicon_fpath, favicon_fpath, fmt="PNG")
@@ -493,46 +593,39 @@ class Openedx2Zim:
         def clean_content(html_article):
             """ removes unwanted elements from homepage html """
 
-            unwanted_elements = {
-                "div": {"class": "dismiss-message"},
-                "a": {"class": "action-show-bookmarks"},
-                "button": {"class": "toggle-visibility-button"},
-            }
-            for element_type, attribute in unwanted_elements.items():
-                element = html_article.find(element_type, attrs=attribute)
-                if element:
-                    element.decompose()
+            unwanted = {}
+            for element in UNWANTED_HOMEPAGE_XPATH(html_article):
+                unwanted.setdefault(element.tag, element)
+            for element in unwanted.values():
+                element.drop_tree()
 
         # download favicon
         self.get_favicon()
 
         # get the course url and generate homepage
         logger.info("Getting homepage ...")
-        content = self.instance_connection.get_page(self.course_url)
-        if not content:
+        html_body = self.get_course_page()
+        if html_body is None:
             logger.error("Error while getting homepage")
             raise SystemExit(1)
         self.build_dir.joinpath("home").mkdir(parents=True, exist_ok=True)
-        soup = BeautifulSoup(content, "lxml")
 
         # save the direction (ltr or rtl)
-        self.is_rtl = True if soup.find("head").attrs["dir"] == "rtl" else False
-        welcome_message = soup.find("div", attrs={"class": "welcome-message"})
+        self.is_rtl = html_body.find("head").get("dir") == "rtl"
+        welcome_message = next(iter(html_body.xpath(WELCOME_MESSAGE_XPATH)), None)
 
         # there are multiple welcome messages
-        if not welcome_message:
-            info_articles = soup.find_all(
-                "div", attrs={"class": re.compile("info-wrapper")}
-            )
+        if welcome_message is None:
+            info_articles = html_body.xpath(INFO_ARTICLES_XPATH)
             if info_articles == []:
                 self.has_homepage = False
             else:
                 for article in info_articles:
                     clean_content(article)
-                    article["class"] = "toggle-visibility-element article-content"
+                    article.set("class", "toggle-visibility-element article-content")
                     self.homepage_html.append(
                         self.html_processor.dl_dependencies_and_fix_links(
-                            content=article.prettify(),
+                            content=article,
                             output_path=self.instance_assets_dir,
                             path_from_html="instance_assets",
                             root_from_html="",
@@ -544,7 +637,7 @@ class Openedx2Zim:
             clean_content(welcome_message)
             self.homepage_html.append(
                 self.html_processor.dl_dependencies_and_fix_links(
-                    content=welcome_message.prettify(),
+                    content=welcome_message,
                     output_path=self.instance_assets_dir,
                     path_from_html="instance_assets",
                     root_from_html="",
@@ -576,11 +669,64 @@ class Openedx2Zim:
             return False
         return True
 
+    def get_s3_key_prefix(self, key):
+        """filetype/netloc/first directory prefix of a key made by generate_s3_key
+
+        the path is URL-encoded in the key, so its first directory ends with %2F.
+        returns None for files at the root of the server"""
+
+        filetype, netloc, safe_path = key.split("/", 2)
+        if "%2F" not in safe_path:
+            return None
+        return f"{filetype}/{netloc}/{safe_path.split('%2F', 1)[0]}%2F"
+
+    def list_cache_keys(self, prefix):
+        """ set of keys in S3 cache starting with prefix, None if there are too many """
+
+        keys = set()
+        for obj in self.s3_storage.resource.Bucket(
+            self.s3_storage.bucket_name
+        ).objects.filter(Prefix=prefix):
+            if len(keys) >= CACHE_LISTING_MAX_KEYS:
+                logger.debug(f"Not listing cache keys with large prefix {prefix}")
+                return None
+            keys.add(obj.key)
+        return keys
+
+    def has_object_in_cache(self, key):
+        """whether key is present in S3 cache
+
+        keys are listed once for each key prefix and looked up locally afterwards.
+        keys of prefixes which could not be listed are checked one by one"""
+
+        prefix = self.get_s3_key_prefix(key)
+        if prefix is None:
+            return self.s3_storage.has_object(key)
+
+        with self.s3_cached_keys_lock:
+            listing = self.s3_cached_keys.get(prefix)
+            is_lister = listing is None
+            if is_lister:
+                listing = self.s3_cached_keys[prefix] = concurrent.futures.Future()
+
+        # list outside of the lock so that lookups of other prefixes are not blocked
+        if is_lister:
+            try:
+                listing.set_result(self.list_cache_keys(prefix))
+            except Exception as exc:
+                logger.error(f"Failed to list cache keys with prefix {prefix}: {exc}")
+                listing.set_result(None)
+
+        cached_keys = listing.result()
+        if cached_keys is None:
+            return self.s3_storage.has_object(key)
+        return key in cached_keys
+
     def download_from_cache(self, key, fpath, meta):
         """ whether it downloaded from S3 cache """
 
         filetype = "jpeg" if fpath.suffix in [".jpeg", ".jpg"] else fpath.suffix[1:]
-        if not self.s3_storage.has_object(key) or not meta:
+        if not meta or not self.has_object_in_cache(key):
             return False
         meta_dict = {
             "version": meta,
@@ -591,7 +737,7 @@ class Openedx2Zim:
         if not self.s3_storage.has_object_matching(key, meta_dict):
             return False
         try:
-            self.s3_storage.download_file(key, fpath)
+            self.s3_storage.download_file(key, fpath, Config=S3_TRANSFER_CONFIG)
         except Exception as exc:
             logger.error(f"{key} failed to download from cache: {exc}")
             return False
@@ -606,10 +752,17 @@ class Openedx2Zim:
             return False
         meta = {"version": meta, "optimizer_version": OPTIMIZER_VERSIONS[filetype]}
         try:
-            self.s3_storage.upload_file(fpath, key, meta=meta)
+            self.s3_storage.upload_file(
+                fpath, key, meta=meta, Config=S3_TRANSFER_CONFIG
+            )
         except Exception as exc:
             logger.error(f"{key} failed to upload to cache: {exc}")
             return False
+        prefix = self.get_s3_key_prefix(key)
+        with self.s3_cached_keys_lock:
+            listing = self.s3_cached_keys.get(prefix)
+        if listing is not None and listing.done() and listing.result() is not None:
+            listing.result().add(key)
         logger.info(f"uploaded {fpath} to cache at {key}")
         return True
 
@@ -626,12 +779,12 @@ class Openedx2Zim:
                 ).name
             )
         try:
-            save_large_file(url, download_path)
+            save_file(url, download_path)
             return download_path
         except Exception as exc:
-            logger.error(f"Error while running save_large_file(): {exc}")
+            logger.error(f"Error while running save_file(): {exc}")
             if download_path.exists() and download_path.is_file():
-                os.unlink(download_path)
+                download_path.unlink()
             return None
 
     def download_from_youtube(self, url, fpath):
@@ -660,28 +813,35 @@ class Openedx2Zim:
             preset = VideoWebmLow() if self.video_format == "webm" else VideoMp4Low()
         elif src.suffix[1:] != self.video_format:
             preset = VideoWebmHigh() if self.video_format == "webm" else VideoMp4High()
-        return reencode(
-            src,
-            dst,
-            preset.to_ffmpeg_args(),
-            delete_src=True,
-            failsafe=False,
-        )
+        with self.video_encoding_slots:
+            return reencode(
+                src,
+                dst,
+                preset.to_ffmpeg_args(),
+                delete_src=True,
+                failsafe=False,
+            )
 
     def optimize_image(self, src, dst):
         optimized = False
-        if src.suffix in [".jpeg", ".jpg"]:
-            optimized = (
-                exec_cmd("jpegoptim --strip-all -m50 " + str(src), timeout=10) == 0
-            )
-        elif src.suffix == ".png":
-            exec_cmd(
-                "pngquant --verbose --nofs --force --ext=.png " + str(src), timeout=10
-            )
-            exec_cmd("advdef -q -z -4 -i 5  " + str(src), timeout=50)
-            optimized = True
-        elif src.suffix == ".gif":
-            optimized = exec_cmd("gifsicle --batch -O3 -i " + str(src), timeout=10) == 0
+        with self.image_optimization_slots:
+            if src.suffix in [".jpeg", ".jpg"]:
+                optimized = (
+                    exec_cmd(["jpegoptim", "--strip-all", "-m50", str(src)], timeout=10)
+                    == 0
+                )
+            elif src.suffix == ".png":
+                exec_cmd(
+                    ["pngquant", "--nofs", "--force", "--ext=.png", str(src)],
+                    timeout=10,
+                )
+                exec_cmd(["advdef", "-q", "-z", "-4", "-i", "5", str(src)], timeout=50)
+                optimized = True
+            elif src.suffix == ".gif":
+                optimized = (
+                    exec_cmd(["gifsicle", "--batch", "-O3", "-i", str(src)], timeout=10)
+                    == 0
+                )
         if src.resolve() != dst.resolve():
             shutil.move(src, dst)
         return optimized
@@ -728,7 +888,10 @@ class Openedx2Zim:
             try:
                 optimized = self.optimize_file(downloaded_file, fpath)
                 if self.s3_storage and optimized:
-                    self.upload_to_cache(s3_key, fpath, meta)
+                    # upload in background so that the next download can start
+                    self.cache_uploads_executor.submit(
+                        self.upload_to_cache, s3_key, fpath, meta
+                    )
             except Exception as exc:
                 logger.error(f"Error while optimizing {fpath}: {exc}")
                 # clean leftovers if any
@@ -799,6 +962,7 @@ class Openedx2Zim:
         shutil.copytree(
             ROOT_DIR.joinpath("templates").joinpath("assets"),
             self.build_dir.joinpath("assets"),
+            copy_function=link_or_copy,
         )
 
     def get_zim_info(self):
@@ -855,6 +1019,8 @@ class Openedx2Zim:
         self.parse_course_xblocks()
         self.annex()
         self.get_content()
+        self.html_processor.shutdown()
+        self.cache_uploads_executor.shutdown(wait=True)
         self.render()
         if not self.no_zim:
             self.fname = (
@@ -881,7 +1047,7 @@ class Openedx2Zim:
             )
             if not self.keep_build_dir:
                 logger.info("Removing temp folder...")
-                shutil.rmtree(self.build_dir, ignore_errors=True)
+                remove_tree(self.build_dir)
         # shutdown the youtube downloader
         self.yt_downloader.shutdown()
         logger.info("Done everything")
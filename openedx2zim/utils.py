@@ -1,23 +1,55 @@
+import concurrent.futures
+import functools
 import html
+import io
 import mimetypes
+import os
 import pathlib
 import re
 import urllib
-import shlex
+import shutil
 import subprocess
+import threading
 import zlib
 
+import lxml.html
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import jinja2
 import mistune
 from slugify import slugify
 from webvtt import WebVTT
+from webvtt.parsers import SRTParser
 
-from .constants import ROOT_DIR, getLogger
+from .constants import ROOT_DIR, SUBTITLE_DOWNLOAD_WORKERS, getLogger
 
 logger = getLogger()
 
+# shared between threads so that requests reuse keep-alive connections
+session = requests.Session()
+for prefix in ("http://", "https://"):
+    session.mount(
+        prefix,
+        HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=5, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504]
+            ),
+        ),
+    )
+
+# xblocks often share display names ("Video", "Problem", ..)
+cached_slugify = functools.lru_cache(maxsize=65536)(slugify)
+
+# lxml parsers serialize concurrent use, so each thread gets its own
+html_parsers = threading.local()
+
+# the SubRip parser of webvtt-py requires the first counter to be 1, not 0
+ZERO_COUNTER_RE = re.compile(r"^0$", re.M)
+
 
 def prepare_url(url, netloc, path_on_remote=None):
     if url.startswith("//"):
@@ -34,9 +66,15 @@ def prepare_url(url, netloc, path_on_remote=None):
     return url
 
 
-def exec_cmd(cmd, timeout=None):
+def exec_cmd(args, timeout=None):
+    """ run a command from its argv list and return its exit code """
     try:
-        return subprocess.run(shlex.split(cmd), timeout=timeout)
+        return subprocess.run(
+            args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout,
+        ).returncode
     except Exception as exc:
         logger.error(exc)
 
@@ -45,16 +83,8 @@ def check_missing_binary():
     """ check whether the required binaries are present on the system """
 
     def bin_is_present(binary):
-        """ checks whether a given binary is present by running it """
-        try:
-            subprocess.run(
-                binary,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-        except OSError:
-            return False
-        return True
+        """ checks whether a given binary is present in PATH """
+        return shutil.which(binary) is not None
 
     for binary in ["jpegoptim", "pngquant", "advdef", "gifsicle", "ffmpeg"]:
         if not bin_is_present(binary):
@@ -80,45 +110,65 @@ def first_word(text):
     return " ".join(text.split(" ")[0:5])
 
 
-def download_and_convert_subtitles(output_path, subtitles, instance_connection):
-    processed_subtitles = {}
-    for lang in subtitles:
-        subtitle_file = pathlib.Path(output_path).joinpath(f"{lang}.vtt")
-        if not subtitle_file.exists():
-            try:
-                raw_subtitle = instance_connection.get_page(subtitles[lang])
-                if not raw_subtitle:
-                    logger.error(f"Subtitle fetch failed from {subtitles[lang]}")
-                    continue
-                subtitle = html.unescape(
-                    re.sub(r"^0$", "1", str(raw_subtitle), flags=re.M)
-                )
-                with open(subtitle_file, "w") as sub_file:
-                    sub_file.write(subtitle)
-                if not is_webvtt(subtitle_file):
-                    webvtt = WebVTT().from_srt(subtitle_file)
-                    webvtt.save()
-                processed_subtitles[lang] = f"{lang}.vtt"
-            except Exception as exc:
-                logger.error(
-                    f"Error while converting subtitle {subtitles[lang]} : {exc}"
-                )
-        else:
-            processed_subtitles[lang] = f"{lang}.vtt"
-    return processed_subtitles
+def is_webvtt(subtitle):
+    first_line = subtitle.split("\n", 1)[0]
+    return "webvtt" in first_line.lower()
 
 
-def is_webvtt(subtitle_file):
-    with open(subtitle_file, "r") as sub_file:
-        first_line = sub_file.readline()
-    return "webvtt" in first_line.lower()
+def download_and_convert_subtitle(subtitle_file, url, instance_connection):
+    """ whether the subtitle at url was saved as WebVTT to subtitle_file """
+
+    try:
+        raw_subtitle = instance_connection.get_page(url)
+        if not raw_subtitle:
+            logger.error(f"Subtitle fetch failed from {url}")
+            return False
+        subtitle = html.unescape(ZERO_COUNTER_RE.sub("1", raw_subtitle))
+        if not is_webvtt(subtitle):
+            # convert from SubRip in memory and only write the result
+            parser = SRTParser().read_from_buffer(io.StringIO(subtitle))
+            buffer = io.StringIO()
+            WebVTT(captions=parser.captions).write(buffer)
+            subtitle = buffer.getvalue()
+        with open(subtitle_file, "w", encoding="utf-8") as sub_file:
+            sub_file.write(subtitle)
+        return True
+    except Exception as exc:
+        logger.error(f"Error while converting subtitle {url} : {exc}")
+        return False
+
+
+def download_and_convert_subtitles(output_path, subtitles, instance_connection):
+    subtitle_files = {lang: output_path.joinpath(f"{lang}.vtt") for lang in subtitles}
+    missing_langs = [
+        lang
+        for lang, subtitle_file in subtitle_files.items()
+        if not subtitle_file.exists()
+    ]
+    downloaded = {}
+    if missing_langs:
+        # fetch the missing languages of the video concurrently
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(missing_langs), SUBTITLE_DOWNLOAD_WORKERS)
+        ) as executor:
+            results = executor.map(
+                lambda lang: download_and_convert_subtitle(
+                    subtitle_files[lang], subtitles[lang], instance_connection
+                ),
+                missing_langs,
+            )
+            downloaded = dict(zip(missing_langs, results))
+    return {lang: f"{lang}.vtt" for lang in subtitles if downloaded.get(lang, True)}
 
 
 def jinja_init():
     global ENV
     templates = ROOT_DIR.joinpath("templates")
     template_loader = jinja2.FileSystemLoader(searchpath=templates)
-    ENV = jinja2.Environment(loader=template_loader, autoescape=False)
+    # templates don't change during a run, don't stat them on every render
+    ENV = jinja2.Environment(
+        loader=template_loader, autoescape=False, auto_reload=False
+    )
     filters = dict(
         slugify=slugify,
         markdown=markdown,
@@ -141,17 +191,44 @@ def jinja(output, template, deflate, **context):
             html_page.write(page)
 
 
-def get_meta_from_url(url):
-    def get_response_headers(url):
-        for attempt in range(5):
+def save_file(url, fpath, max_attempts=5):
+    """streams the content at url to fpath, raising on HTTP errors
+
+    a transfer interrupted while streaming the body is resumed with a Range request
+    when the server supports it, and restarted otherwise"""
+
+    written = 0
+    for attempt in range(1, max_attempts + 1):
+        headers = {"Range": f"bytes={written}-"} if written else {}
+        with session.get(url, headers=headers, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # whole content, range not requested or not supported
+                written = 0
+            # offsets in an encoded body don't match the decoded bytes written
+            resumable = "content-encoding" not in response.headers
             try:
-                return requests.head(url=url, allow_redirects=True, timeout=30).headers
-            except requests.exceptions.Timeout:
-                logger.error(f"{url} > HEAD request timed out ({attempt})")
-        raise Exception("Max retries exceeded")
+                with open(fpath, "ab" if written else "wb") as fh:
+                    for chunk in response.iter_content(chunk_size=2 ** 20):
+                        fh.write(chunk)
+                        if resumable:
+                            written += len(chunk)
+                return
+            except (
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ConnectionError,
+            ) as exc:
+                if attempt == max_attempts:
+                    raise
+                logger.warning(f"{url} > Transfer interrupted, retrying: {exc}")
 
+
+def get_meta_from_url(url):
+    # timeouts and server errors are retried by the session
     try:
-        response_headers = get_response_headers(url)
+        response_headers = session.head(
+            url=url, allow_redirects=True, timeout=30
+        ).headers
     except Exception as exc:
         logger.error(f"{url} > Problem with head request\n{exc}\n")
         return None, None
@@ -169,6 +246,17 @@ def get_meta_from_url(url):
     return None, content_ext
 
 
+def parse_html(content):
+    """ parses an HTML string to an lxml element, without indexing ids and size limits """
+
+    parser = getattr(html_parsers, "parser", None)
+    if parser is None:
+        parser = html_parsers.parser = lxml.html.HTMLParser(
+            collect_ids=False, huge_tree=True
+        )
+    return lxml.html.fromstring(content, parser=parser)
+
+
 def remove_autogenerated_tags(html_string):
     """ removes <head> and <html> and <body> tags from endpoints of a string """
 
@@ -183,6 +271,29 @@ def remove_autogenerated_tags(html_string):
     return html_string
 
 
+def link_or_copy(src, dst):
+    """hard links src to dst, copying it when linking is not possible
+
+    to be used as shutil.copytree's copy_function for files that are never modified"""
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def remove_tree(path):
+    """removes a directory tree, ignoring errors
+
+    uses rm when available as it is much faster than shutil.rmtree on large build dirs"""
+
+    if shutil.which("rm"):
+        subprocess.run(["rm", "-rf", "--", str(path)], check=False)
+    if path.exists():
+        shutil.rmtree(path, ignore_errors=True)
+
+
 def get_back_jumps(nb_jumps):
     """ return a string path containing back jumps nb_jumps number of times """
 
@@ -1,4 +1,4 @@
-from slugify import slugify
+from ..utils import cached_slugify
 
 
 class BaseXblock:
@@ -12,7 +12,7 @@ class BaseXblock:
         self.xblock_id = xblock_id
         self.descendants = descendants
         self.display_name = xblock_json["display_name"]
-        self.folder_name = slugify(self.display_name)
+        self.folder_name = cached_slugify(self.display_name)
         self.output_path = self.scraper.build_dir.joinpath(output_path)
 
         # make xblock output directory
@@ -1,3 +1,4 @@
+import concurrent.futures
 import json
 import uuid
 import itertools
@@ -7,7 +8,7 @@ from bs4 import BeautifulSoup
 
 from .base_xblock import BaseXblock
 from ..utils import jinja, get_back_jumps, remove_autogenerated_tags
-from ..constants import getLogger
+from ..constants import getLogger, PROBLEM_CHECK_WORKERS
 
 
 logger = getLogger()
@@ -124,29 +125,29 @@ class Problem(BaseXblock):
         if answers_fetchable:
             # answer fetching is feasible
             if single_correct:
-                # fetch answer for single correct question
-                for answer_candidate in options_list:
-                    result = self.check_answer([answer_candidate], instance_connection)
-                    if result["success"] in ["correct", "incorrect"]:
-                        html_content_to_replace = get_html_replacement_content(result)
-                        self.answers.update(
-                            {
-                                answer_candidate.attrs.get("id"): str(
-                                    html_content_to_replace
-                                )
-                            }
-                        )
-                    else:
-                        logger.error("Answer fetching failed...")
-                        return
+                # each option alone for single correct question
+                answer_candidates = [[option] for option in options_list]
             else:
-                # fetch answer for multiple correct question
-                # generate all possible combinations
-                for r in range(1, len(options_list) + 1):
-                    for answer_candidate in itertools.combinations(options_list, r):
-                        result = self.check_answer(
-                            answer_candidate, instance_connection
-                        )
+                # all possible combinations for multiple correct question
+                answer_candidates = [
+                    answer_candidate
+                    for r in range(1, len(options_list) + 1)
+                    for answer_candidate in itertools.combinations(options_list, r)
+                ]
+
+            # check the candidates concurrently, answers are recorded in order
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=PROBLEM_CHECK_WORKERS
+            ) as executor:
+                fs = [
+                    executor.submit(
+                        self.check_answer, answer_candidate, instance_connection
+                    )
+                    for answer_candidate in answer_candidates
+                ]
+                try:
+                    for answer_candidate, future in zip(answer_candidates, fs):
+                        result = future.result()
                         if result["success"] in ["correct", "incorrect"]:
                             html_content_to_replace = get_html_replacement_content(
                                 result
@@ -162,6 +163,10 @@ class Problem(BaseXblock):
                         else:
                             logger.error("Answer fetching failed...")
                             return
+                finally:
+                    # don't send the candidates not yet started after a failure
+                    for future in fs:
+                        future.cancel()
 
             self.write_answers_and_mark_available()
 
@@ -171,9 +176,9 @@ class Problem(BaseXblock):
     def clean_problem_content(self, soup):
         """ removes unnecessary content from the problem content """
 
-        # remove all notifications
-        for div in soup.find_all("div", attrs={"class": "notification"}):
-            div.decompose()
+        # remove all notifications, unanswered markers and screen reader texts
+        for tag in soup.select("div.notification, span.unanswered, span.sr"):
+            tag.decompose()
 
         # clear all inputs
         for input_tag in soup.find_all("input"):
@@ -183,22 +188,16 @@ class Problem(BaseXblock):
                 del input_tag.attrs["checked"]
 
         # clear all previously answered labels
-        label_list = soup.find_all("label", attrs={"class": "response-label"})
-        for label in label_list:
-            if "choicegroup_correct" in label["class"]:
-                label["class"].remove("choicegroup_correct")
+        for label in soup.select("label.response-label.choicegroup_correct"):
+            label["class"].remove("choicegroup_correct")
 
         # clear messages (if previously answered on instance)
-        span_message = soup.find("span", attrs={"class": "message"})
+        span_message = soup.select_one("span.message")
         if span_message:
             span_message.decompose()
 
         # remove action bar (contains the submission button)
-        soup.find("div", attrs={"class": "action"}).decompose()
-        for span in soup.find_all("span", attrs={"class": "unanswered"}):
-            span.decompose()
-        for span in soup.find_all("span", attrs={"class": "sr"}):
-            span.decompose()
+        soup.select_one("div.action").decompose()
 
     def download(self, instance_connection):
         """ download the problem xblock content from the instance """
@@ -208,21 +207,14 @@ class Problem(BaseXblock):
         if not content:
             return
         raw_soup = BeautifulSoup(content, "lxml")
-        self.xmodule_handler = str(
-            raw_soup.find("div", attrs={"class": "problems-wrapper"})["data-url"]
-        )
+        problems_wrapper = raw_soup.find("div", attrs={"class": "problems-wrapper"})
+        self.xmodule_handler = problems_wrapper["data-url"]
         try:
-            html_content_from_div = str(
-                raw_soup.find("div", attrs={"class": "problems-wrapper"})[
-                    "data-content"
-                ]
-            )
+            html_content_from_div = problems_wrapper["data-content"]
         except Exception:
-            html_content_from_div = str(
-                instance_connection.get_api_json(self.xmodule_handler + "/problem_get")[
-                    "html"
-                ]
-            )
+            html_content_from_div = instance_connection.get_api_json(
+                self.xmodule_handler + "/problem_get"
+            )["html"]
 
         # assign a random problem ID
         self.problem_id = str(uuid.uuid4())
@@ -259,7 +251,7 @@ class Problem(BaseXblock):
         )
 
         # save the content
-        self.html_content = remove_autogenerated_tags(str(html_content))
+        self.html_content = remove_autogenerated_tags(html_content)
 
     def render(self):
         """ render the fetched content and return it """
@@ -52,12 +52,8 @@ class Vertical(BaseXblock):
         # its safe to extract all scripts/styles within window-wrap recursively as all content
         # in xblocks are escaped and we would not have duplicates when we have scripts/styles within
         # xblock contents handled by the respective xblock_extractors
-        window_wrap = soup.find("div", attrs={"class": "window-wrap"})
-        extra_tags = (
-            window_wrap.find_all("script")
-            + window_wrap.find_all("style")
-            + window_wrap.find_all("link", attrs={"rel": "stylesheet"})
-        )
+        window_wrap = soup.select_one("div.window-wrap")
+        extra_tags = window_wrap.select("script, style, link[rel~=stylesheet]")
         for script in extra_tags:
             self.extra_content.append(
                 remove_autogenerated_tags(
@@ -71,11 +67,11 @@ class Vertical(BaseXblock):
             )
 
         # get divs with class vert as those contain extra CSS classes to be applied at render step
-        seq_contents = soup.find_all("div", attrs={"class": "seq_contents"})
+        seq_contents = soup.select("div.seq_contents")
         for content in seq_contents:
             unescaped_html = html.unescape(content.string)
             new_soup = BeautifulSoup(unescaped_html, "lxml")
-            self.verts += new_soup.find_all("div", attrs={"class": "vert"})
+            self.verts += new_soup.select("div.vert")
 
     def render(self, prev_vertical, next_vertical, chapter, sequential):
         vertical = []